@@ -16,6 +16,7 @@ from models import (
 import pydantic
 import json
 import random
+import asyncio
 
 # Get logger for this module
 logger = logging.getLogger(__name__)
@@ -43,7 +44,7 @@ class ActionLayer:
             
             result = await self.recipe_session.call_tool(
                 "get_recipe",
-                {"input": input_model.model_dump()}
+                {"dish_name": input_model.dish_name}
             )
             logger.debug(f"Raw recipe result type: {type(result)}")
             logger.debug(f"Raw recipe result structure: {result}")
@@ -547,13 +548,11 @@ class ActionLayer:
                     )
                     
                     # Format the recipe text for display
-                    display_text = f"Recipe for {recipe_output.recipe_name}:\n\n"
-                    display_text += "Required ingredients:\n"
-                    for ing in recipe_output.required_ingredients:
-                        display_text += f"- {ing}\n"
-                    display_text += "\nSteps:\n"
-                    for i, step in enumerate(recipe_output.recipe_steps, 1):
-                        display_text += f"{i}. {step}\n"
+                    lines = [f"Recipe for {recipe_output.recipe_name}:", "", "Required ingredients:"]
+                    lines.extend(f"- {ing}" for ing in recipe_output.required_ingredients)
+                    lines.extend(["", "Steps:"])
+                    lines.extend(f"{i}. {step}" for i, step in enumerate(recipe_output.recipe_steps, 1))
+                    display_text = "\n".join(lines) + "\n"
                     
                     logger.debug(f"Formatted recipe display text: {display_text}")
                     return ToolResponse(
@@ -609,7 +608,7 @@ class ActionLayer:
                 
                 try:
                     # Call our local method instead of the MCP tool
-                    result = self.check_pantry_items(required_ingredients)
+                    result = await self.check_pantry_items(required_ingredients)
                     
                     # Update memory with results
                     self.memory.update_memory(
@@ -973,7 +972,7 @@ class ActionLayer:
 </html>
 """
 
-    def check_pantry_items(self, required_ingredients):
+    async def check_pantry_items(self, required_ingredients):
         """
         Check what ingredients are available in user's pantry and what's missing 
         from required ingredients. This is done directly in the action layer
@@ -982,22 +981,17 @@ class ActionLayer:
         logger.info(f"Checking pantry for required ingredients: {required_ingredients}")
         
         # Ask user to input pantry items
-        print("\nPlease enter the ingredients you have in your pantry.")
-        print("Enter each ingredient on a new line. Type 'done' when finished.")
-        print("\nRequired ingredients:")
-        for ing in required_ingredients:
-            print(f"- {ing}")
+        # Build the whole prompt first so it is written out in one go
+        prompt_lines = [
+            "\nPlease enter the ingredients you have in your pantry.",
+            "Enter each ingredient on a new line. Type 'done' when finished.",
+            "\nRequired ingredients:"
+        ]
+        prompt_lines.extend(f"- {ing}" for ing in required_ingredients)
+        print("\n".join(prompt_lines))
         
-        pantry_items = []
-        while True:
-            try:
-                item = input().strip().lower()
-                if item == 'done':
-                    break
-                if item:  # Only add non-empty items
-                    pantry_items.append(item)
-            except EOFError:
-                break
+        # Collect every line in one worker thread so typing doesn't block the event loop
+        pantry_items = await asyncio.to_thread(self._read_pantry_items)
         
         logger.info(f"User entered pantry items: {pantry_items}")
         
@@ -1005,16 +999,19 @@ class ActionLayer:
         missing_ingredients = []
         available_ingredients = []
         
+        # Exact matches are a set lookup, only the rest fall back to substring matching
+        pantry_set = set(pantry_items)
+        
         for required in required_ingredients:
             # Check if any pantry item matches or is similar to the required ingredient
-            found = False
-            for pantry_item in pantry_items:
-                # Simple matching - could be enhanced with fuzzy matching
-                if required.lower() in pantry_item or pantry_item in required.lower():
-                    available_ingredients.append(required)
-                    found = True
-                    break
-            if not found:
+            required_lower = required.lower()
+            # Simple matching - could be enhanced with fuzzy matching
+            if required_lower in pantry_set or any(
+                required_lower in pantry_item or pantry_item in required_lower
+                for pantry_item in pantry_items
+            ):
+                available_ingredients.append(required)
+            else:
                 missing_ingredients.append(required)
         
         # Log results
@@ -1023,8 +1020,10 @@ class ActionLayer:
         
         # Create message
         if missing_ingredients:
-            message = f"You have {len(available_ingredients)} of {len(required_ingredients)} required ingredients.\n"
-            message += "Missing ingredients:\n" + "\n".join(f"- {ing}" for ing in missing_ingredients)
+            message = (
+                f"You have {len(available_ingredients)} of {len(required_ingredients)} required ingredients.\n"
+                "Missing ingredients:\n" + "\n".join(f"- {ing}" for ing in missing_ingredients)
+            )
         else:
             message = "You have all required ingredients!"
         
@@ -1040,6 +1039,20 @@ class ActionLayer:
             "message": message
         }
 
+    def _read_pantry_items(self) -> List[str]:
+        """Read pantry items from stdin, one per line, until 'done' or end of input"""
+        pantry_items = []
+        while True:
+            try:
+                item = input().strip().lower()
+                if item == 'done':
+                    break
+                if item:  # Only add non-empty items
+                    pantry_items.append(item)
+            except EOFError:
+                break
+        return pantry_items
+
     def get_user_email(self):
         """
         Prompt the user to enter their email address for order confirmation.
@@ -1,4 +1,4 @@
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Optional, Union
 import logging
 from models import (
     ActionType, Decision, ActionPlan,
@@ -6,6 +6,7 @@ from models import (
     LLMResponse, PantryCheckInput
 )
 from google import genai
+from llm import generate_json_with_timeout
 import json
 import asyncio
 
@@ -25,25 +26,24 @@ class DecisionLayer:
             # Create decision prompt
             prompt = self._create_decision_prompt(context, system_prompt)
             
-            # Get LLM response
-            response = await self._generate_with_timeout(prompt)
-            response_text = response.text
+            # Get LLM response, streamed until the JSON object is complete
+            response_text = await self._generate_with_timeout(prompt)
             
             # Parse and validate LLM response
             parsed_response = self._parse_llm_response(response_text)
             
             # Only log essential information about the response
             if parsed_response.type == "reasoning_block":
-                logger.info(f"Decision: Reasoning with next action '{parsed_response.next}'")
+                logger.info("Decision: Reasoning with next action '%s'", parsed_response.next)
             elif parsed_response.type == "function_call":
-                logger.info(f"Decision: Call function '{parsed_response.function}'")
+                logger.info("Decision: Call function '%s'", parsed_response.function)
             else:
-                logger.info(f"Decision: Final answer")
+                logger.info("Decision: Final answer")
             
             return parsed_response
 
         except Exception as e:
-            logger.error(f"Error in decision making: {e}", exc_info=True)
+            logger.error("Error in decision making: %s", e, exc_info=True)
             # On error, return a reasoning block to handle the error
             return ReasoningBlock(
                 type="reasoning_block",
@@ -110,11 +110,11 @@ Based on this information, what should be the next action? Respond in the requir
             
             # Parse the JSON response
             response_data = json.loads(cleaned_text)
-            logger.debug(f"Parsed LLM response data: {response_data}")
+            logger.debug("Parsed LLM response data: %s", response_data)
             
             # Get response type
             response_type = response_data.get("type")
-            #logger.debug(f"Response type: {response_type}")
+            #logger.debug("Response type: %s", response_type)
             
             if response_type == "reasoning_block":
                 # Validate reasoning block fields
@@ -122,7 +122,7 @@ Based on this information, what should be the next action? Respond in the requir
                 for field in required_fields:
                     if field not in response_data:
                         raise ValueError(f"Missing required field '{field}' in reasoning block")
-                logger.debug(f"Next action from reasoning block: {response_data['next']}")
+                logger.debug("Next action from reasoning block: %s", response_data['next'])
                 return ReasoningBlock(**response_data)
                 
             elif response_type == "function_call":
@@ -132,8 +132,8 @@ Based on this information, what should be the next action? Respond in the requir
                 if "parameters" not in response_data:
                     raise ValueError("Missing 'parameters' field in function call")
                 
-                logger.debug(f"Function to call: {response_data['function']}")
-                logger.debug(f"Function parameters: {response_data['parameters']}")
+                logger.debug("Function to call: %s", response_data['function'])
+                logger.debug("Function parameters: %s", response_data['parameters'])
                 
                 # Validate function parameters based on action type
                 function = response_data.get("function")
@@ -142,9 +142,9 @@ Based on this information, what should be the next action? Respond in the requir
                 try:
                     # Try to convert function to ActionType enum
                     action_type = ActionType(function)
-                    logger.debug(f"Successfully mapped function to action type: {action_type}")
+                    logger.debug("Successfully mapped function to action type: %s", action_type)
                 except ValueError:
-                    logger.error(f"Invalid action type: {function}")
+                    logger.error("Invalid action type: %s", function)
                     raise ValueError(f"Invalid action type: {function}")
                 
                 if function == ActionType.FETCH_RECIPE.value:
@@ -173,7 +173,7 @@ Based on this information, what should be the next action? Respond in the requir
                 else:
                     from models import InvalidInputParams
                     parameters["params"] = InvalidInputParams(message=f"Unsupported action type: {function}")
-                    logger.warning(f"Created InvalidInputParams for unsupported action: {function}")
+                    logger.warning("Created InvalidInputParams for unsupported action: %s", function)
                 
                 response_data["parameters"] = parameters
                 return FunctionCall(**response_data)
@@ -184,39 +184,25 @@ Based on this information, what should be the next action? Respond in the requir
                 logger.debug("Processing final answer response")
                 return FinalAnswer(**response_data)
             else:
-                logger.error(f"Invalid response type: {response_type}")
+                logger.error("Invalid response type: %s", response_type)
                 raise ValueError(f"Invalid response type: {response_type}")
 
         except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse LLM response as JSON: {e}")
-            logger.error(f"Raw response text: {response_text}")
+            logger.error("Failed to parse LLM response as JSON: %s", e)
+            logger.error("Raw response text: %s", response_text)
             raise
         except Exception as e:
-            logger.error(f"Error parsing LLM response: {e}", exc_info=True)
+            logger.error("Error parsing LLM response: %s", e, exc_info=True)
             raise
 
-    async def _generate_with_timeout(self, prompt: str, timeout: int = 30) -> Any:
-        """Generate LLM response with timeout"""
+    async def _generate_with_timeout(self, prompt: str, timeout: int = 30) -> str:
+        """Generate LLM response text with timeout"""
         try:
-            # Add delay to prevent throttling
-            await asyncio.sleep(2)
-            
-            # Run LLM generation in thread pool
-            loop = asyncio.get_event_loop()
-            response = await asyncio.wait_for(
-                loop.run_in_executor(
-                    None,
-                    lambda: self.llm_client.models.generate_content(
-                        model="gemini-2.0-flash",
-                        contents=prompt
-                    )
-                ),
-                timeout=timeout
-            )
-            return response
+            # Streamed until the JSON object closes, throttled and retried once on a slow first attempt
+            return await generate_json_with_timeout(self.llm_client, prompt, timeout)
         except asyncio.TimeoutError:
             logger.error("LLM generation timed out")
             raise
         except Exception as e:
-            logger.error(f"Error in LLM generation: {e}")
-            raise 
\ No newline at end of file
+            logger.error("Error in LLM generation: %s", e)
+            raise
@@ -0,0 +1,184 @@
+from typing import Any, Awaitable, Callable, Optional
+import logging
+import os
+import time
+import asyncio
+import orjson
+
+# Get logger for this module
+logger = logging.getLogger(__name__)
+
+MODEL = "gemini-2.0-flash"
+
+class LLMThrottle:
+    """Token bucket that allows bursts of up to `burst` LLM calls and refills at calls_per_minute"""
+
+    def __init__(self, calls_per_minute: float = 30.0, burst: int = 1):
+        self.min_interval = 60.0 / calls_per_minute
+        self.burst = max(1, burst)
+        # Time at which the bucket would be completely refilled
+        self._next_slot = 0.0
+
+    @classmethod
+    def from_env(cls) -> "LLMThrottle":
+        """Build from GEMINI_QPM and GEMINI_BURST, defaulting to one call every two seconds.
+
+        A value that isn't a positive number falls back to the default with a warning,
+        so a typo in .env can't disable every LLM call.
+        """
+        try:
+            calls_per_minute = float(os.environ.get("GEMINI_QPM", 30))
+            burst = int(os.environ.get("GEMINI_BURST", 1))
+            if not calls_per_minute > 0 or burst <= 0:  # Also rejects nan
+                raise ValueError("rate limits must be positive")
+        except ValueError as e:
+            logger.warning("Invalid GEMINI_QPM/GEMINI_BURST (%s), using 30 calls per minute with burst 1", e)
+            return cls()
+        return cls(calls_per_minute=calls_per_minute, burst=burst)
+
+    def _allowed_at(self) -> float:
+        """Earliest time the next call may start"""
+        return self._next_slot - (self.burst - 1) * self.min_interval
+
+    async def wait(self):
+        """Take a token, sleeping only when the bucket is empty"""
+        now = time.monotonic()
+        start = max(now, self._allowed_at())
+        # Reserve the token before sleeping so concurrent callers queue up behind it
+        self._next_slot = max(now, self._next_slot) + self.min_interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+class AdaptiveTimeout:
+    """Derives a first-attempt timeout from a running average of call latency"""
+
+    def __init__(self, factor: float = 2.0, floor: float = 5.0, alpha: float = 0.3):
+        self.factor = factor
+        self.floor = floor
+        self.alpha = alpha
+        self.average: Optional[float] = None
+
+    def budget(self, hard_timeout: float) -> float:
+        """Timeout for the first attempt, never above the hard timeout"""
+        if self.average is None:
+            return hard_timeout
+        return min(hard_timeout, max(self.floor, self.factor * self.average))
+
+    def record(self, elapsed: float):
+        """Fold a completed call's latency into the average"""
+        if self.average is None:
+            self.average = elapsed
+        else:
+            self.average = self.alpha * elapsed + (1 - self.alpha) * self.average
+
+class JsonObjectScanner:
+    """Incrementally finds the first complete JSON object in streamed text"""
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0  # Next offset of the buffer to scan
+        self.start = None  # Offset of the current candidate's opening brace
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.result = None  # Text of the object, once found
+
+    def feed(self, text: str) -> bool:
+        """Scan the next chunk of text, returns True once a whole object has been read"""
+        self.buffer += text
+        while self.pos < len(self.buffer):
+            char = self.buffer[self.pos]
+            self.pos += 1
+            if self.start is None:
+                # Nothing before the first brace is tracked, quotes in preamble text included
+                if char == "{":
+                    self.start = self.pos - 1
+                    self.depth = 1
+            elif self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    candidate = self.buffer[self.start:self.pos]
+                    try:
+                        orjson.loads(candidate)
+                    except orjson.JSONDecodeError:
+                        # The brace was part of preamble text, rescan from just after it
+                        self.pos = self.start + 1
+                        self.start = None
+                        self.in_string = False
+                        self.escaped = False
+                        continue
+                    self.result = candidate
+                    return True
+        return False
+
+# Shared by every layer so the combined call rate is throttled. Built on first use
+# rather than at import, so rate limits loaded from .env afterwards still apply
+_throttle: Optional[LLMThrottle] = None
+latency = AdaptiveTimeout()
+
+def get_throttle() -> LLMThrottle:
+    """Get the shared throttle, configuring it from the environment on first use"""
+    global _throttle
+    if _throttle is None:
+        _throttle = LLMThrottle.from_env()
+    return _throttle
+
+async def call_with_timeout(func: Callable[..., Awaitable[Any]], *args, timeout: float = 30) -> Any:
+    """Await an async LLM call with a timeout.
+
+    The first attempt gets a timeout based on recent latency; if that runs out
+    the call is retried once with the full timeout.
+    """
+    budget = latency.budget(timeout)
+    limits = (budget, timeout) if budget < timeout else (timeout,)
+
+    for attempt, limit in enumerate(limits, 1):
+        await get_throttle().wait()
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(func(*args), timeout=limit)
+        except asyncio.TimeoutError:
+            if attempt == len(limits):
+                raise
+            logger.warning("LLM call exceeded %.1fs, retrying with %ss timeout", limit, timeout)
+            continue
+        latency.record(time.monotonic() - start)
+        return result
+
+async def generate_with_timeout(client, prompt: str, timeout: float = 30) -> Any:
+    """Generate content with a timeout using the client's native async API"""
+    async def generate():
+        return await client.aio.models.generate_content(model=MODEL, contents=prompt)
+    return await call_with_timeout(generate, timeout=timeout)
+
+async def stream_json(client, prompt: str) -> str:
+    """Stream LLM output and stop reading once the top-level JSON object closes"""
+    scanner = JsonObjectScanner()
+    stream = await client.aio.models.generate_content_stream(
+        model=MODEL,
+        contents=prompt
+    )
+    try:
+        async for chunk in stream:
+            if scanner.feed(chunk.text or ""):
+                logger.debug("JSON response complete, stopping stream early")
+                return scanner.result
+    finally:
+        # Release the HTTP response now rather than whenever the stream is collected
+        await stream.aclose()
+    return scanner.buffer
+
+async def generate_json_with_timeout(client, prompt: str, timeout: float = 30) -> str:
+    """Stream a JSON reply with a timeout, returning its text"""
+    return await call_with_timeout(stream_json, client, prompt, timeout=timeout)
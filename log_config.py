@@ -1,12 +1,37 @@
 import logging
-from colorama import Fore, Back, Style, init
+import os
+import sys
 
-# Initialize colorama
-init(autoreset=True)
+# Emit raw ANSI colors only when logging to a terminal that understands them,
+# redirected output (files, CI) stays free of escape codes
+USE_COLORS = sys.stderr.isatty() and (os.name != 'nt' or 'WT_SESSION' in os.environ)
+
+def _ansi(code):
+    return f"\x1b[{code}m" if USE_COLORS else ""
+
+class Fore:
+    """ANSI foreground colors"""
+    RED = _ansi(31)
+    GREEN = _ansi(32)
+    YELLOW = _ansi(33)
+    BLUE = _ansi(34)
+    MAGENTA = _ansi(35)
+    CYAN = _ansi(36)
+    WHITE = _ansi(37)
+
+class Back:
+    """ANSI background colors"""
+    WHITE = _ansi(47)
+
+class Style:
+    """ANSI style codes"""
+    RESET_ALL = _ansi(0)
 
 # Global variable to track iteration
 current_iteration = 0
 
+ITERATION_INIT = f" [{Fore.CYAN}Init{Style.RESET_ALL}]"
+
 def set_iteration(iteration_number):
     """Set current iteration number for logging"""
     global current_iteration
@@ -29,46 +54,61 @@ class ColoredFormatter(logging.Formatter):
         'memory': Fore.BLUE,
         'action': Fore.YELLOW,
         'decision': Fore.GREEN,
+        'llm': Fore.CYAN,
         'main': Fore.WHITE,
         '__main__': Fore.WHITE
     }
 
-    def format(self, record):
-        # Save the original format
-        orig_format = self._style._fmt
-
-        # Add colors based on level
-        levelname_color = self.COLORS.get(record.levelname, '')
-        
-        # Get module color
-        module_name = record.name.split('.')[-1]  # Get the last part of the module name
-        module_color = self.MODULE_COLORS.get(module_name, Fore.WHITE)
-        
-        # Format the module name with its color
-        colored_module = f"{module_color}{module_name}{Style.RESET_ALL}"
-        
-        # Format the level name with its color
-        colored_level = f"{levelname_color}{record.levelname}{Style.RESET_ALL}"
-        
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Colored "module - LEVEL" labels, built once per (logger name, level)
+        self._labels = {}
+
+    def _label(self, name, levelname):
+        """Get the colored module and level part of the line"""
+        label = self._labels.get((name, levelname))
+        if label is None:
+            module_name = name.rpartition('.')[2]  # Get the last part of the module name
+            module_color = self.MODULE_COLORS.get(module_name, Fore.WHITE)
+            levelname_color = self.COLORS.get(levelname, '')
+            label = f"{module_color}{module_name}{Style.RESET_ALL} - {levelname_color}{levelname}{Style.RESET_ALL}"
+            self._labels[(name, levelname)] = label
+        return label
+
+    def usesTime(self):
+        # The timestamp is always part of the line
+        return True
+
+    def formatMessage(self, record):
+        # Formatter.format fills in asctime and message and appends tracebacks,
+        # only the line itself is assembled here
+
         # Include iteration number or 'Init' for pre-iteration logs
         if current_iteration == 0:
-            iteration_info = f" [{Fore.CYAN}Init{Style.RESET_ALL}]"
+            iteration_info = ITERATION_INIT
         else:
             iteration_info = f" [{Fore.CYAN}Iter:{current_iteration + 1}{Style.RESET_ALL}]"
-        
-        # Set the format with colors and iteration number
-        self._style._fmt = f'%(asctime)s{iteration_info} - {colored_module} - {colored_level} - %(message)s'
 
-        # Call the original format method
-        result = super().format(record)
+        return f"{record.asctime}{iteration_info} - {self._label(record.name, record.levelname)} - {record.message}"
 
-        # Restore the original format
-        self._style._fmt = orig_format
+def set_root_level(level=None):
+    """Set the root logger's level, defaulting to LOG_LEVEL or DEBUG if unset.
+
+    An unknown level name falls back to DEBUG with a warning instead of failing at startup.
+    """
+    root_logger = logging.getLogger()
+    level = level or os.environ.get("LOG_LEVEL", "DEBUG").upper()
+    try:
+        root_logger.setLevel(level)
+    except ValueError:
+        root_logger.setLevel(logging.DEBUG)
+        root_logger.warning("Unknown log level %r, using DEBUG", level)
 
-        return result
+def setup_logging(level=None):
+    """Setup logging configuration with colors.
 
-def setup_logging():
-    """Setup logging configuration with colors"""
+    The level defaults to the LOG_LEVEL environment variable, or DEBUG if unset.
+    """
     # Create handler
     handler = logging.StreamHandler()
     
@@ -91,4 +131,4 @@ def setup_logging():
     root_logger.addHandler(handler)
     
     # Set level
-    root_logger.setLevel(logging.DEBUG) 
\ No newline at end of file
+    set_root_level(level)
@@ -1,28 +1,58 @@
 import os
+import sys
 import time
 import logging
 from datetime import datetime
-from dotenv import load_dotenv
 from google import genai
 import asyncio
 from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+from mcp.client.stdio import get_default_environment, stdio_client
 from perception import PerceptionLayer
-from memory import MemoryLayer
+from memory import MemoryLayer, clear_memory_files
 from decision import DecisionLayer
 from action import ActionLayer
 from typing import Optional
-from models import ActionPlan, LLMResponse
+from contextlib import AsyncExitStack
+from models import ActionPlan, LLMResponse, ToolInfo
 from log_config import setup_logging, set_iteration
+import llm
+
+# .env next to this script, so the app finds it whatever the working directory
+ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+
+def parse_env_value(value: str) -> str:
+    """Unquote a .env value, or drop a trailing inline comment from an unquoted one"""
+    value = value.strip()
+    if value[:1] in ('"', "'"):
+        # Only a matching pair of quotes is removed, anything after the closing one is ignored
+        end = value.find(value[0], 1)
+        if end != -1:
+            return value[1:end]
+    return value.split(" #", 1)[0].rstrip()
+
+def load_env_file(path: str = ENV_FILE) -> None:
+    """Load KEY=VALUE pairs from a .env file without overriding existing variables"""
+    if not os.path.exists(path):
+        return
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+            # Accept shell-style "export KEY=value" lines
+            if line.startswith('export '):
+                line = line[len('export '):]
+            key, _, value = line.partition('=')
+            os.environ.setdefault(key.strip(), parse_env_value(value))
+
+# Load environment variables first, LOG_LEVEL may come from .env
+start_time = time.time()
+load_env_file()
 
 # Configure logging using our custom configuration
 setup_logging()
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-logger.info("Loading environment variables...")
-start_time = time.time()
-load_dotenv()
 logger.info(f"Environment variables loaded in {time.time() - start_time:.2f}s")
 
 # Initialize Gemini client
@@ -39,68 +69,47 @@ async def generate_with_timeout(client, prompt, timeout=30):
     logger.info("Starting LLM generation...")
     start_time = time.time()
     try:
-        await asyncio.sleep(2)  # Prevent throttling
-        loop = asyncio.get_event_loop()
-        response = await asyncio.wait_for(
-            loop.run_in_executor(
-                None, 
-                lambda: client.models.generate_content(
-                    model="gemini-2.0-flash",
-                    contents=prompt
-                )
-            ),
-            timeout=timeout
-        )
+        response = await llm.generate_with_timeout(client, prompt, timeout)
         logger.info(f"LLM generation completed in {time.time() - start_time:.2f}s")
         return response
     except Exception as e:
         logger.error(f"Error in LLM generation after {time.time() - start_time:.2f}s: {e}")
         raise
 
-class GroceryAssistant:
-    def __init__(self):
-        self._context_managers = []
-        self.llm_client = llm_client
-        self.perception = None
-        self.memory = None
-        self.decision = None
-        self.action = None
-        self.system_prompt = None
-        self.recipe_session = None
-        self.delivery_session = None
-        self.gmail_session = None
+async def display(*args, **kwargs):
+    """Print from a worker thread so a slow terminal can't stall the event loop"""
+    await asyncio.to_thread(print, *args, flush=True, **kwargs)
 
-    def create_system_prompt(self, tools_description: str) -> str:
-        """Create the system prompt with available tools"""
-        return f"""You are an intelligent cooking assistant that helps users prepare dishes by managing recipes and ingredients. You have access to various tools and must follow structured reasoning and execution steps.
+# Static parts of the system prompt, the tools description goes in between
+SYSTEM_PROMPT_HEAD = """You are an intelligent cooking assistant that helps users prepare dishes by managing recipes and ingredients. You have access to various tools and must follow structured reasoning and execution steps.
 
 You must respond in exactly one of these formats:
 
 For reasoning:
-{{
+{
   "type": "reasoning_block",
   "reasoning_type": "planning",
   "steps": ["step 1", "step 2"],
   "verify": "verification step",
   "next": "next action",
   "fallback_plan": "fallback plan"
-}}
+}
 
 For tool calls:
-{{
+{
   "type": "function_call",
   "function": "exact_tool_name",
-  "parameters": {{
+  "parameters": {
     "param1": "value1"
-  }},
+  },
   "on_fail": "fallback plan"
-}}
+}
 
 For final answer:
-{{
+{
   "type": "final_answer",
   "value": "the final result"
-}}
+}
 
 WHEN TO USE REASONING BLOCKS:
 - At the beginning of a complex task
@@ -119,7 +128,9 @@ FAILURE HANDLING RULES:
 - Return new reasoning block on unexpected failures
 
 AVAILABLE TOOLS:
-{tools_description}
+"""
+
+SYSTEM_PROMPT_TAIL = """
 
 RULES:
 1. Return EXACTLY ONE valid JSON object
@@ -133,100 +144,173 @@ RULES:
 
 Before responding, verify you are following all rules."""
 
+# MCP server launch parameters, in (recipe, delivery, gmail) order
+MCP_SERVERS = (
+    StdioServerParameters(
+        command="python",
+        args=["recipe_mcp_server.py"],
+        # Servers only get a minimal default environment, pass the log level on explicitly
+        env={**get_default_environment(), "LOG_LEVEL": os.environ.get("LOG_LEVEL", "DEBUG")}
+    ),
+    StdioServerParameters(
+        command="python",
+        args=["delivery_mcp_server.py"]
+    ),
+    StdioServerParameters(
+        command="python",
+        args=["gmail_mcp_server.py", "--creds-file-path", "credentials.json", "--token-path", "token.json"]
+    ),
+)
+
+# Live MCP sessions keyed by server command line, shared by every assistant in
+# the process and only torn down by close_mcp_sessions()
+_SESSION_POOL = {}
+_session_pool_stack = AsyncExitStack()
+_session_pool_lock = asyncio.Lock()
+
+def _pool_key(params: StdioServerParameters) -> tuple:
+    return (params.command, tuple(params.args))
+
+async def open_mcp_sessions() -> tuple:
+    """Return initialized (recipe, delivery, gmail) sessions, starting any server not yet pooled"""
+    async with _session_pool_lock:
+        started = []
+        try:
+            for params in MCP_SERVERS:
+                key = _pool_key(params)
+                if key not in _SESSION_POOL:
+                    read, write = await _session_pool_stack.enter_async_context(stdio_client(params))
+                    session = await _session_pool_stack.enter_async_context(ClientSession(read, write))
+                    started.append((key, session))
+
+            if started:
+                # Contexts are entered one by one since their cancel scopes belong to this
+                # task; the handshakes are plain requests, so the servers start up in parallel.
+                # Every handshake is let finish so none is left running when one fails
+                logger.info("Sessions created, initializing...")
+                results = await asyncio.gather(
+                    *(session.initialize() for _, session in started),
+                    return_exceptions=True
+                )
+                for result in results:
+                    if isinstance(result, BaseException):
+                        raise result
+                _SESSION_POOL.update(started)
+            else:
+                logger.info("Reusing pooled MCP sessions")
+        except Exception:
+            # Started servers sit on the stack whether or not they were pooled, and its
+            # contexts can only exit in reverse order, so the whole pool is shut down.
+            # A retry then starts every server afresh instead of leaking these processes
+            logger.error("Failed to start MCP sessions, closing the session pool")
+            await close_mcp_sessions()
+            raise
+
+    return tuple(_SESSION_POOL[_pool_key(params)] for params in MCP_SERVERS)
+
+async def close_mcp_sessions():
+    """Shut down every pooled MCP session and server process"""
+    global _session_pool_stack
+    logger.info("Closing MCP sessions...")
+    _SESSION_POOL.clear()
+    # Clients hold anyio cancel scopes that must exit in this task in reverse
+    # order; the stack keeps unwinding if one exit fails and re-raises at the end
+    try:
+        await _session_pool_stack.aclose()
+    except Exception as e:
+        logger.error(f"Error closing MCP sessions: {e}", exc_info=True)
+    _session_pool_stack = AsyncExitStack()
+
+class GroceryAssistant:
+    def __init__(self, persist_memory: bool = True):
+        self.llm_client = llm_client
+        # When False memory stays in this process and memory.json is never touched
+        self.persist_memory = persist_memory
+        self.perception = None
+        self.memory = None
+        self.decision = None
+        self.action = None
+        self.system_prompt = None
+        self.recipe_session = None
+        self.delivery_session = None
+        self.gmail_session = None
+        self.is_setup = False
+
+    def create_system_prompt(self, tools_description: str) -> str:
+        """Create the system prompt with available tools"""
+        return "".join((SYSTEM_PROMPT_HEAD, tools_description, SYSTEM_PROMPT_TAIL))
+
+    def build_system_prompt(self, tools: list) -> str:
+        """Build the system prompt from the listed MCP tools"""
+        # Read each tool's schema once into a typed record
+        logger.info("Creating tools description...")
+        tool_infos = [ToolInfo.from_tool(tool) for tool in tools]
+        tools_description = "\n".join(
+            f"{i}. {tool.name}({tool.params_str}) - {tool.description}"
+            for i, tool in enumerate(tool_infos, 1)
+        )
+
+        # Create system prompt
+        logger.info("Creating system prompt...")
+        return self.create_system_prompt(tools_description)
+
+    async def warm_up_llm(self, timeout: float = 5):
+        """Open the LLM client's connection ahead of the first real call.
+
+        Fetches the model's metadata through the async client the layers use,
+        which sets up its HTTP connection without spending a generation request. Failures only cost the warm-up.
+        """
+        try:
+            await asyncio.wait_for(
+                self.llm_client.aio.models.get(model=llm.MODEL),
+                timeout=timeout
+            )
+            logger.debug("LLM client warmed up")
+        except Exception as e:
+            logger.warning(f"LLM warm-up failed: {e}")
+
     async def setup(self):
         """Setup the assistant components"""
+        if self.is_setup:
+            # Servers and sessions are still alive from a previous run, only reset state
+            logger.info("Reusing existing MCP sessions, resetting state...")
+            self.reset()
+            return
+
         setup_start = time.time()
         logger.info("Starting assistant setup...")
 
+        # Open the Gemini connection while the MCP servers start up
+        warm_up = asyncio.create_task(self.warm_up_llm())
+
         # Create MCP server connections
         logger.info("Establishing connections to MCP servers...")
 
-        recipe_params = StdioServerParameters(
-            command="python",
-            args=["recipe_mcp_server.py"]
-        )
-        delivery_params = StdioServerParameters(
-            command="python",
-            args=["delivery_mcp_server.py"]
-        )
-        gmail_params = StdioServerParameters(
-            command="python",
-            args=["gmail_mcp_server.py", "--creds-file-path", "credentials.json", "--token-path", "token.json"]
-        )
-
-        # Create and store clients using context managers
-        recipe_cm = stdio_client(recipe_params)
-        delivery_cm = stdio_client(delivery_params)
-        gmail_cm = stdio_client(gmail_params)
-        
-        self._context_managers.extend([recipe_cm, delivery_cm, gmail_cm])
-        
-        recipe_io = await recipe_cm.__aenter__()
-        delivery_io = await delivery_cm.__aenter__()
-        gmail_io = await gmail_cm.__aenter__()
-
-        # Create sessions using context managers
-        recipe_session_cm = ClientSession(*recipe_io)
-        delivery_session_cm = ClientSession(*delivery_io)
-        gmail_session_cm = ClientSession(*gmail_io)
-        
-        self._context_managers.extend([recipe_session_cm, delivery_session_cm, gmail_session_cm])
-        
-        self.recipe_session = await recipe_session_cm.__aenter__()
-        self.delivery_session = await delivery_session_cm.__aenter__()
-        self.gmail_session = await gmail_session_cm.__aenter__()
-
-        logger.info("Sessions created, initializing...")
-        await self.recipe_session.initialize()
-        await self.delivery_session.initialize()
-        await self.gmail_session.initialize()
+        self.recipe_session, self.delivery_session, self.gmail_session = \
+            await open_mcp_sessions()
 
         # Get available tools
         logger.info("Fetching available tools...")
         tools_start = time.time()
-        recipe_tools = await self.recipe_session.list_tools()
-        delivery_tools = await self.delivery_session.list_tools()
-        gmail_tools = await self.gmail_session.list_tools()
+        recipe_tools, delivery_tools, gmail_tools = await asyncio.gather(
+            self.recipe_session.list_tools(),
+            self.delivery_session.list_tools(),
+            self.gmail_session.list_tools()
+        )
         logger.info(f"Tools fetched in {time.time() - tools_start:.2f}s")
 
-        # Create tools description
-        logger.info("Creating tools description...")
-        tools_desc = []
-        for tools_result in [recipe_tools, delivery_tools, gmail_tools]:
-            if hasattr(tools_result, 'tools'):
-                tools = tools_result.tools
-            else:
-                tools = tools_result
-
-            for tool in tools:
-                try:
-                    name = tool.name if hasattr(tool, 'name') else 'unnamed_tool'
-                    desc = tool.description if hasattr(tool, 'description') else 'No description available'
-                    
-                    # Handle input schema
-                    params_str = 'no parameters'
-                    if hasattr(tool, 'inputSchema') and isinstance(tool.inputSchema, dict):
-                        if 'properties' in tool.inputSchema:
-                            param_details = []
-                            for param_name, param_info in tool.inputSchema['properties'].items():
-                                param_type = param_info.get('type', 'unknown')
-                                param_details.append(f"{param_name}: {param_type}")
-                            params_str = ', '.join(param_details)
-
-                    tool_desc = f"{len(tools_desc) + 1}. {name}({params_str}) - {desc}"
-                    tools_desc.append(tool_desc)
-                except Exception as e:
-                    logger.error(f"Error processing tool: {e}")
-                    continue
-        
-        # Create system prompt
-        logger.info("Creating system prompt...")
-        self.system_prompt = self.create_system_prompt("\n".join(tools_desc))
+        all_tools = [
+            tool
+            for tools_result in (recipe_tools, delivery_tools, gmail_tools)
+            for tool in tools_result.tools
+        ]
+        self.system_prompt = self.build_system_prompt(all_tools)
         logger.debug(f"System prompt: {self.system_prompt}")
+        await warm_up
         # Initialize components
         logger.info("Initializing components...")
         self.perception = PerceptionLayer(self.llm_client)
-        self.memory = MemoryLayer()
+        self.memory = MemoryLayer(persist_to_disk=self.persist_memory)
         self.decision = DecisionLayer(self.llm_client)
         self.action = ActionLayer(
             self.recipe_session,
@@ -234,31 +318,30 @@ Before responding, verify you are following all rules."""
             self.gmail_session,
             self.memory
         )
+        self.is_setup = True
         
         logger.info(f"Assistant setup completed in {time.time() - setup_start:.2f}s")
 
+    def reset(self):
+        """Reset per-run state while keeping the MCP sessions alive"""
+        self.perception.last_dish_name = None
+        self.memory.clear_memory()
+        set_iteration(0)
+
     async def cleanup(self):
-        """Cleanup resources"""
+        """Cleanup per-run resources, pooled MCP sessions stay open"""
         logger.info("Starting cleanup...")
-        # Clean up in reverse order
-        for cm in reversed(self._context_managers):
+        self.is_setup = False
+        # Let pending memory saves land before the file is reset below
+        if self.memory is not None:
+            self.memory.flush()
+        # Reset memory file to empty dictionary
+        if self.persist_memory:
             try:
-                if cm is not None:
-                    logger.debug(f"Cleaning up context manager: {cm}")
-                    await cm.__aexit__(None, None, None)
+                clear_memory_files()
+                logger.debug("Memory file cleared")
             except Exception as e:
-                logger.error(f"Error during cleanup: {e}", exc_info=True)
-                # Continue cleanup even if one fails
-                continue
-        self._context_managers.clear()
-        # Reset memory file to empty dictionary
-        try:
-            with open('memory.json', 'w') as f:
-                import json
-                f.write(json.dumps({}))
-            logger.debug("Memory file cleared")
-        except Exception as e:
-            logger.error(f"Error clearing memory file: {e}")
+                logger.error(f"Error clearing memory file: {e}")
         logger.info("Cleanup completed")
 
     async def process_input(self, user_input: dict) -> dict:
@@ -298,19 +381,28 @@ Before responding, verify you are following all rules."""
             logger.error(f"Error in input processing after {time.time() - process_start:.2f}s: {e}")
             raise
 
-async def main():
+async def main(assistant: Optional[GroceryAssistant] = None, persist_memory: bool = True):
+    """Run one cooking session.
+
+    MCP sessions come from the shared pool either way. Passing an already set up
+    assistant also reuses its tools description and components; in that case the
+    caller owns the assistant and is responsible for calling cleanup() once done.
+    persist_memory only applies to an assistant created here.
+    """
     logger.info("Starting main execution...")
-    assistant = GroceryAssistant()
+    owns_assistant = assistant is None
+    if owns_assistant:
+        assistant = GroceryAssistant(persist_memory)
     
     try:
         # Setup assistant
         await assistant.setup()
         
         # Get initial user input
-        print("\nEnter a word to start cooking: ", end='')
-        user_word = input().strip()
+        await display("\nEnter a word to start cooking: ", end='')
+        user_word = (await asyncio.to_thread(input)).strip()
         if not user_word:
-            print("Error: Input cannot be empty")
+            await display("Error: Input cannot be empty")
             return
 
         # Create initial input
@@ -334,10 +426,9 @@ async def main():
                 # Handle result
                 if result:
                     if hasattr(result, 'content'):
-                        for content in result.content:
-                            print(content.text)
+                        await display("\n".join(content.text for content in result.content))
                     else:
-                        print(result)
+                        await display(result)
 
                 # Check if task is complete based on LLM response or recipe display
                 memory = assistant.memory.get_memory()
@@ -361,8 +452,8 @@ async def main():
 
                 # Get next user input if needed
                 if memory["current_state"] == "awaiting_user_input":
-                    print("\nPlease provide the requested information: ", end='')
-                    user_response = input().strip()
+                    await display("\nPlease provide the requested information: ", end='')
+                    user_response = (await asyncio.to_thread(input)).strip()
                     user_input = {
                         "user_response": user_response
                     }
@@ -373,25 +464,48 @@ async def main():
 
             except Exception as e:
                 logger.error(f"Error in iteration {iteration + 1}: {e}")
-                print(f"An error occurred: {str(e)}")
+                await display(f"An error occurred: {str(e)}")
                 break
 
             iteration += 1
             # Update the iteration number in the log config
             set_iteration(iteration)
-            await asyncio.sleep(0.1)  # Prevent throttling
 
         if iteration >= max_iterations:
             logger.warning("Reached maximum iterations without completing the task")
-            print("\nTask took too long to complete. Please try again.")
+            await display("\nTask took too long to complete. Please try again.")
 
     except Exception as e:
         logger.error(f"Fatal error in main execution: {e}", exc_info=True)
-        print(f"\nA fatal error occurred: {str(e)}")
+        await display(f"\nA fatal error occurred: {str(e)}")
     
     finally:
-        # Cleanup
+        # Cleanup, keeping the components alive for a caller-owned assistant
+        if owns_assistant:
+            await assistant.cleanup()
+
+async def serve(persist_memory: bool = True):
+    """Run cooking sessions back to back on a single set of MCP servers"""
+    assistant = GroceryAssistant(persist_memory)
+    try:
+        while True:
+            await main(assistant)
+            await display("\nWould you like to cook another dish? (y/n): ", end='')
+            if (await asyncio.to_thread(input)).strip().lower() != 'y':
+                break
+    finally:
         await assistant.cleanup()
 
+async def run(entry_point, **kwargs):
+    """Run an entry point coroutine function, then shut down the MCP servers"""
+    try:
+        await entry_point(**kwargs)
+    finally:
+        await close_mcp_sessions()
+
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    # --no-persist keeps memory in this process only, nothing is read from or written to memory.json
+    asyncio.run(run(
+        serve if "--repeat" in sys.argv else main,
+        persist_memory="--no-persist" not in sys.argv
+    )) 
\ No newline at end of file
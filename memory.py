@@ -1,39 +1,90 @@
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Mapping
+from types import MappingProxyType
 import logging
-import json
+import orjson
 import os
-from models import AgentMemory, MemoryError, UserIntent
-from pydantic import BaseModel, Field
+from concurrent.futures import ThreadPoolExecutor
+from models import MemoryError, UserIntent
 
 # Get logger for this module
 logger = logging.getLogger(__name__)
 
+# Memory keys whose updates are worth logging
+IMPORTANT_KEYS = frozenset(["current_state", "last_action", "last_action_status", "order_placed", "email_sent"])
+
+# Number of delta log entries after which the log is folded into the memory file
+COMPACT_EVERY = 20
+
+# Initial value of every memory key, fields still at these values are left out of snapshots
+_INITIAL_STATE = {
+    # Recipe related
+    "dish_name": None,
+    "required_ingredients": [],
+    "missing_ingredients": [],
+    "available_ingredients": [],  # Added for storing pantry items
+    "recipe_steps": [],
+    
+    # Order related
+    "order_placed": False,
+    "order_id": None,
+    "order_details": {},  # Add order_details to store items and total
+    "email_sent": False,
+    "user_email": None,
+    
+    # State tracking
+    "current_state": "initial",
+    "last_action": None,
+    "last_action_status": None,
+    "retries": 0,
+    "last_error": None
+}
+
+def initial_memory_state() -> Dict[str, Any]:
+    """Fresh copy of the initial memory, lists and dicts are not shared with the template"""
+    return {
+        key: value.copy() if isinstance(value, (list, dict)) else value
+        for key, value in _INITIAL_STATE.items()
+    }
+
+def delta_log_path(memory_file: str) -> str:
+    """Path of the append-only update log kept next to the memory file"""
+    return memory_file + ".log"
+
+def write_atomic(path: str, data: bytes) -> None:
+    """Write data to a temporary file and swap it into place.
+
+    Readers only ever see the old or the new contents, never a half-written
+    file. There is no fsync; the swap itself is what keeps the file consistent.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def clear_memory_files(memory_file: str = "memory.json") -> None:
+    """Reset the memory file to an empty dictionary and drop its delta log"""
+    write_atomic(memory_file, orjson.dumps({}))
+    if os.path.exists(delta_log_path(memory_file)):
+        os.remove(delta_log_path(memory_file))
+
 class MemoryLayer:
-    def __init__(self, memory_file: str = "memory.json"):
+    def __init__(self, memory_file: str = "memory.json", persist_to_disk: bool = True):
         self.memory_file = memory_file
-        self._memory = {
-            # Recipe related
-            "dish_name": None,
-            "required_ingredients": [],
-            "missing_ingredients": [],
-            "available_ingredients": [],  # Added for storing pantry items
-            "recipe_steps": [],
-            
-            # Order related
-            "order_placed": False,
-            "order_id": None,
-            "order_details": {},  # Add order_details to store items and total
-            "email_sent": False,
-            "user_email": None,
-            
-            # State tracking
-            "current_state": "initial",
-            "last_action": None,
-            "last_action_status": None,
-            "retries": 0,
-            "last_error": None
-        }
-        self._load_memory()
+        # When False memory lives only in this process, nothing is read from or written to disk
+        self.persist_to_disk = persist_to_disk
+        self.log_file = delta_log_path(memory_file)
+        self._deltas_since_compaction = 0
+        self._memory = initial_memory_state()
+        # Read-only view handed out by get_memory, it follows every later update
+        self._memory_view = MappingProxyType(self._memory)
+        # Saves are written by a single background thread so they keep their order
+        # without making callers wait on disk I/O
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-writer")
+        self._pending_save = None
+        # Context handed to the decision layer, refilled in place on every get_context call
+        self._context = {"current_state": {}, "task_progress": {}, "recipe_details": {}, "order_details": {}}
+        if persist_to_disk:
+            self._load_memory()
 
     def update_memory(self, **kwargs):
         """Update memory with new values"""
@@ -41,196 +92,174 @@ class MemoryLayer:
         
         # Avoid logging full memory state - it gets verbose
         # Only log important updates
-        important_keys = ["current_state", "last_action", "last_action_status", "order_placed", "email_sent"]
-        important_updates = {k: v for k, v in kwargs.items() if k in important_keys}
-        if important_updates:
-            logger.debug(f"Important updates: {important_updates}")
+        if logger.isEnabledFor(logging.DEBUG):
+            important_updates = {k: v for k, v in kwargs.items() if k in IMPORTANT_KEYS}
+            if important_updates:
+                logger.debug("Important updates: %s", important_updates)
         
         # Update memory with new values
+        changes = {}
         for key, value in kwargs.items():
-            if key in self._memory:
+            if key not in self._memory:
+                logger.warning("Attempted to update unknown memory key: %s", key)
+            elif not self._is_unchanged(key, value):
                 self._memory[key] = value
-            else:
-                logger.warning(f"Attempted to update unknown memory key: {key}")
+                changes[key] = value
         
+        # Nothing new, skip the save
+        if not changes:
+            logger.debug("Memory update is a no-op, skipping save")
+            return
+
         # Save updated memory
-        self._save_memory()
+        self._save_memory(changes)
 
-    def get_memory(self) -> Dict[str, Any]:
-        """Get current memory state"""
-        return self._memory.copy()  # Return a copy to prevent accidental modifications
+    def _is_unchanged(self, key: str, value: Any) -> bool:
+        """Check whether a value matches what memory already holds for key"""
+        current = self._memory[key]
+        if value is current and isinstance(value, (list, dict)):
+            # The same container may have been modified in place since it was stored
+            return False
+        return value == current
 
-    # Commented out older version of get_context in favor of the newer implementation below
-    # that handles perceived input and uses the newer memory model
-    # def get_context(self) -> Dict[str, Any]:
-    #     """Get context for decision making"""
-    #     logger.info("Getting context for decision making")
-    #     
-    #     # Create context from current memory state
-    #     context = {
-    #         "current_state": {
-    #             "state": self._memory["current_state"],
-    #             "last_action": self._memory["last_action"],
-    #             "last_action_status": self._memory["last_action_status"],
-    #             "retries": self._memory["retries"],
-    #             "last_error": self._memory["last_error"]
-    #         },
-    #         "task_progress": {
-    #             "dish_name": self._memory["dish_name"],
-    #             "recipe_obtained": bool(self._memory["recipe_steps"]),
-    #             "ingredients_checked": bool(self._memory["missing_ingredients"]),
-    #             "order_placed": self._memory["order_placed"],
-    #             "email_sent": self._memory["email_sent"]
-    #         },
-    #         "recipe_details": {
-    #             "required_ingredients": self._memory["required_ingredients"],
-    #             "missing_ingredients": self._memory["missing_ingredients"],
-    #             "recipe_steps": self._memory["recipe_steps"]
-    #         },
-    #         "order_details": {
-    #             "order_id": self._memory["order_id"],
-    #             "user_email": self._memory["user_email"]
-    #         }
-    #     }
-    #     
-    #     logger.debug(f"Created context: {context}")
-    #     return context
+    def get_memory(self) -> Mapping[str, Any]:
+        """Get a read-only view of the current memory state"""
+        return self._memory_view  # Callers that need a snapshot can take dict(view)
 
     def _load_memory(self):
-        """Load memory from file"""
+        """Load memory from file, then replay the delta log on top of it"""
         try:
+            saved_memory = {}
             if os.path.exists(self.memory_file):
-                with open(self.memory_file, 'r') as f:
-                    saved_memory = json.load(f)
-                    # Only update keys that exist in current memory
-                    for key in self._memory.keys():
-                        if key in saved_memory:
-                            self._memory[key] = saved_memory[key]
+                with open(self.memory_file, 'rb') as f:
+                    saved_memory = orjson.loads(f.read())
+            if os.path.exists(self.log_file):
+                with open(self.log_file, 'rb') as f:
+                    for line_number, line in enumerate(f, 1):
+                        if not line.strip():
+                            continue
+                        try:
+                            delta = orjson.loads(line)
+                        except orjson.JSONDecodeError as e:
+                            # A torn append from a crash, keep everything replayed so far
+                            logger.warning("Stopping delta log replay at line %s: %s", line_number, e)
+                            break
+                        saved_memory.update(delta)
+            # Only update keys that exist in current memory
+            for key in self._memory.keys():
+                if key in saved_memory:
+                    self._memory[key] = saved_memory[key]
         except Exception as e:
-            logger.error(f"Error loading memory: {e}")
+            logger.error("Error loading memory: %s", e)
+
+    def _save_memory(self, changes: Optional[Dict[str, Any]] = None):
+        """Schedule a write of memory to file.
 
-    def _save_memory(self):
-        """Save memory to file"""
+        Changed fields are appended to the delta log; the full memory is written
+        (and the log truncated) when no changes are given or every COMPACT_EVERY
+        deltas.
+        """
+        if not self.persist_to_disk:
+            return
         logger.info("Saving memory to disk")
         try:
-            logger.debug(f"Memory to save: {self._memory}")
-            with open(self.memory_file, 'w') as f:
-                json.dump(self._memory, f)
-            logger.debug("Memory saved successfully")
+            # Serialize now so later updates can't leak into what gets written
+            if changes is not None and self._deltas_since_compaction < COMPACT_EVERY:
+                logger.debug("Memory changes to save: %s", changes)
+                self._deltas_since_compaction += 1
+                data = orjson.dumps(changes) + b"\n"
+                self._pending_save = self._writer.submit(self._append_delta, data)
+            else:
+                logger.debug("Memory to save: %s", self._memory)
+                self._deltas_since_compaction = 0
+                # Defaults are restored on load, so only fields that differ are written
+                data = orjson.dumps({
+                    key: value for key, value in self._memory.items()
+                    if value != _INITIAL_STATE.get(key)
+                })
+                self._pending_save = self._writer.submit(self._write_memory_file, data)
         except Exception as e:
-            logger.error(f"Error saving memory: {e}")
+            logger.error("Error saving memory: %s", e)
 
-    # Commented out as this version is not used. The class uses _load_memory instead
-    # which works with self._memory dictionary directly
-    # def load_memory(self) -> AgentMemory:
-    #     """Load memory from disk or create new if doesn't exist"""
-    #     if not self.persist_to_disk:
-    #         logger.debug("Disk persistence disabled, using in-memory only")
-    #         return AgentMemory()
-    # 
-    #     logger.info("Loading memory from disk")
-    #     try:
-    #         if os.path.exists(self.memory_file):
-    #             logger.debug(f"Memory file exists: {self.memory_file}")
-    #             with open(self.memory_file, 'r') as f:
-    #                 data = json.load(f)
-    #                 logger.debug(f"Loaded memory data: {data}")
-    #             try:
-    #                 memory = AgentMemory.model_validate(data)
-    #                 logger.debug(f"Created AgentMemory model: {memory}")
-    #                 return memory
-    #             except Exception as e:
-    #                 error = MemoryError(
-    #                     error_type="ValidationError",
-    #                     message="Failed to validate loaded memory data",
-    #                     details={"data": data, "error": str(e)}
-    #                 )
-    #                 logger.error(error.model_dump_json())
-    #                 return AgentMemory()
-    #     except Exception as e:
-    #         error = MemoryError(
-    #             error_type="LoadError",
-    #             message=f"Error loading memory: {str(e)}",
-    #             details={"file": self.memory_file}
-    #         )
-    #         logger.error(error.model_dump_json())
-    #     
-    #     logger.info("Creating new memory instance")
-    #     return AgentMemory()
+    def _append_delta(self, data: bytes):
+        """Append one serialized update to the delta log, runs on the writer thread"""
+        try:
+            with open(self.log_file, 'ab') as f:
+                f.write(data)
+            logger.debug("Memory changes saved successfully")
+        except Exception as e:
+            logger.error("Error saving memory: %s", e)
 
-    # Commented out as this version is not used. The class uses _save_memory instead
-    # which works with self._memory dictionary directly
-    # def save_memory(self) -> None:
-    #     """Save current memory state to disk if persistence is enabled"""
-    #     if not self.persist_to_disk:
-    #         logger.debug("Disk persistence disabled, skipping save")
-    #         return
-    # 
-    #     logger.info("Saving memory to disk")
-    #     try:
-    #         memory_dict = self.memory.model_dump()
-    #         logger.debug(f"Memory to save: {memory_dict}")
-    #         with open(self.memory_file, 'w') as f:
-    #             json.dump(memory_dict, f, indent=2)
-    #         logger.debug("Memory saved successfully")
-    #     except Exception as e:
-    #         error = MemoryError(
-    #             error_type="SaveError",
-    #             message=f"Error saving memory: {str(e)}",
-    #             details={"file": self.memory_file}
-    #         )
-    #         logger.error(error.model_dump_json())
+    def _write_memory_file(self, data: bytes):
+        """Write the full serialized memory and truncate the delta log, runs on the writer thread"""
+        try:
+            write_atomic(self.memory_file, data)
+            # The snapshot now covers every logged change
+            if os.path.exists(self.log_file):
+                os.remove(self.log_file)
+            logger.debug("Memory saved successfully")
+        except Exception as e:
+            logger.error("Error saving memory: %s", e)
+
+    def flush(self):
+        """Wait until all scheduled saves have been written"""
+        if self._pending_save is not None:
+            self._pending_save.result()
+            self._pending_save = None
 
     def get_context(self, perceived_input: Optional[UserIntent] = None) -> dict:
-        """Get context for decision making based on perceived input and memory"""
+        """Get context for decision making based on perceived input and memory.
+
+        The returned dict is reused by the next call; copy it to keep a snapshot.
+        """
         logger.info("Getting context for decision making")
-        logger.debug(f"Perceived input: {perceived_input}")
+        logger.debug("Perceived input: %s", perceived_input)
         
         try:
             # Update memory if new input is provided
             if perceived_input:
+                # Collect all changed fields so they are written in one update,
+                # a repeat of what memory already holds needs no write at all
                 updates = {}
-                if perceived_input.dish_name:
+                if perceived_input.dish_name and perceived_input.dish_name != self._memory["dish_name"]:
                     updates["dish_name"] = perceived_input.dish_name
-                if perceived_input.user_email:
+                if perceived_input.user_email and perceived_input.user_email != self._memory["user_email"]:
                     updates["user_email"] = perceived_input.user_email
                 
                 if updates:
-                    logger.debug(f"Updating memory with perceived input: {updates}")
+                    logger.debug("Updating memory with perceived input: %s", updates)
                     self.update_memory(**updates)
             
             # Create context dictionary with metadata
-            memory_state = self.get_memory()  # Get current memory state
-            logger.debug(f"Building context from memory state: {memory_state}")
+            # Read the live dict directly and refill the reused context containers
+            memory_state = self._memory
+            logger.debug("Building context from memory state: %s", memory_state)
             
-            context = {
-                "current_state": {
-                    "state": memory_state["current_state"],
-                    "last_action": memory_state["last_action"],
-                    "last_action_status": memory_state["last_action_status"],
-                    "retries": memory_state["retries"],
-                    "last_error": memory_state["last_error"]
-                },
-                "task_progress": {
-                    "dish_name": memory_state["dish_name"],
-                    "recipe_obtained": bool(memory_state["recipe_steps"]),
-                    "ingredients_checked": bool(memory_state["missing_ingredients"]),
-                    "order_placed": memory_state["order_placed"],
-                    "email_sent": memory_state["email_sent"],
-                    "user_email": memory_state["user_email"]
-                },
-                "recipe_details": {
-                    "required_ingredients": memory_state["required_ingredients"],
-                    "missing_ingredients": memory_state["missing_ingredients"],
-                    "available_ingredients": memory_state["available_ingredients"],
-                    "recipe_steps": memory_state["recipe_steps"]
-                },
-                "order_details": {
-                    "order_id": memory_state["order_id"]
-                }
-            }
+            context = self._context
+            context["current_state"].update(
+                state=memory_state["current_state"],
+                last_action=memory_state["last_action"],
+                last_action_status=memory_state["last_action_status"],
+                retries=memory_state["retries"],
+                last_error=memory_state["last_error"]
+            )
+            context["task_progress"].update(
+                dish_name=memory_state["dish_name"],
+                recipe_obtained=bool(memory_state["recipe_steps"]),
+                ingredients_checked=bool(memory_state["missing_ingredients"]),
+                order_placed=memory_state["order_placed"],
+                email_sent=memory_state["email_sent"],
+                user_email=memory_state["user_email"]
+            )
+            context["recipe_details"].update(
+                required_ingredients=memory_state["required_ingredients"],
+                missing_ingredients=memory_state["missing_ingredients"],
+                available_ingredients=memory_state["available_ingredients"],
+                recipe_steps=memory_state["recipe_steps"]
+            )
+            context["order_details"]["order_id"] = memory_state["order_id"]
             
-            logger.debug(f"Created context: {context}")
+            logger.debug("Created context: %s", context)
             return context
             
         except KeyError as ke:
@@ -239,53 +268,25 @@ class MemoryLayer:
                 message=f"Missing required memory key: {ke}",
                 details={"memory_state": memory_state}
             )
-            logger.error(error.model_dump_json())
-            raise ValueError(error.model_dump_json())
+            # Serialize once for both the log line and the raised error
+            error_json = error.model_dump_json()
+            logger.error(error_json)
+            raise ValueError(error_json)
         except Exception as e:
             error = MemoryError(
                 error_type="ContextError",
                 message=f"Error creating context: {str(e)}",
                 details={"perceived_input": perceived_input.model_dump() if perceived_input else None}
             )
-            logger.error(error.model_dump_json())
-            raise ValueError(error.model_dump_json())
+            # Serialize once for both the log line and the raised error
+            error_json = error.model_dump_json()
+            logger.error(error_json)
+            raise ValueError(error_json)
 
     def clear_memory(self) -> None:
         """Reset memory to initial state"""
         logger.info("Resetting memory state")
-        self._memory = {
-            "dish_name": None,
-            "required_ingredients": [],
-            "missing_ingredients": [],
-            "available_ingredients": [],  # Added for storing pantry items
-            "recipe_steps": [],
-            "order_placed": False,
-            "order_id": None,
-            "order_details": {},  # Add order_details to stay consistent
-            "email_sent": False,
-            "user_email": None,
-            "current_state": "initial",
-            "last_action": None,
-            "last_action_status": None,
-            "retries": 0,
-            "last_error": None
-        }
+        # Reset in place so the view from get_memory stays attached
+        self._memory.update(initial_memory_state())
         self._save_memory()
         logger.debug("Memory reset to initial state")
-
-    # Commented out as clear_memory() above provides a more complete implementation
-    # def _clear_memory_file(self) -> None:
-    #     """Clear the memory file - should only be called during initialization"""
-    #     logger.info("Clearing memory file")
-    #     try:
-    #         if os.path.exists(self.memory_file):
-    #             with open(self.memory_file, 'w') as f:
-    #                 json.dump({}, f)
-    #             logger.debug("Memory file cleared")
-    #     except Exception as e:
-    #         error = MemoryError(
-    #             error_type="ClearError",
-    #             message=f"Error clearing memory file: {str(e)}",
-    #             details={"file": self.memory_file}
-    #         )
-    #         logger.error(error.model_dump_json()) 
\ No newline at end of file
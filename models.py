@@ -1,6 +1,25 @@
-from typing import List, Dict, Any, Optional, Union, Literal
+from typing import List, Dict, Any, Optional, Union, Literal, Tuple, Annotated
 from enum import Enum
-from pydantic import BaseModel, Field, EmailStr, constr
+import re
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field
+
+# Simple shape check for email addresses, compiled once at import
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+def _check_email(value: str) -> str:
+    """Reject strings that don't look like an email address"""
+    if not EMAIL_RE.match(value):
+        raise ValueError("value is not a valid email address")
+    return value
+
+# Email address type, checked with the regex above instead of the email-validator package
+Email = Annotated[str, AfterValidator(_check_email)]
+
+# Base for every model below, schemas are built on first use so each process
+# (the agent and each MCP server) only pays for the models it actually touches
+class LazyModel(BaseModel):
+    """Base model whose validator and serializer are built on first use"""
+    model_config = ConfigDict(defer_build=True)
 
 # Action Type Enum
 class ActionType(str, Enum):
@@ -15,99 +34,99 @@ class ActionType(str, Enum):
     INVALID_INPUT = "invalid_input"
 
 # Tool Response Models
-class TextContent(BaseModel):
+class TextContent(LazyModel):
     """Model for text content in tool responses"""
     type: str = "text"
     text: str
 
-class ToolResponse(BaseModel):
+class ToolResponse(LazyModel):
     """Model for tool responses"""
     content: List[TextContent]
 
 # Input/Output Models for MCP Tools
-class RawInput(BaseModel):
+class RawInput(LazyModel):
     """Raw user input model"""
     raw_text: str = ""
     user_email: Optional[str] = None
     dish_name: Optional[str] = None
 
-class UserIntent(BaseModel):
+class UserIntent(LazyModel):
     """Enhanced user intent model"""
     dish_name: Optional[str] = None
     user_email: Optional[str] = None
 
-class GetRecipeInput(BaseModel):
+class GetRecipeInput(LazyModel):
     """Input for get_recipe tool"""
     dish_name: str
 
-class GetRecipeOutput(BaseModel):
+class GetRecipeOutput(LazyModel):
     """Output from get_recipe tool"""
     recipe_name: Optional[str] = None
     required_ingredients: List[str]
     recipe_steps: List[str]
 
-class PantryCheckInput(BaseModel):
+class PantryCheckInput(LazyModel):
     """Input for check_pantry tool"""
     ingredients: List[str]
 
-class PantryCheckOutput(BaseModel):
+class PantryCheckOutput(LazyModel):
     """Output from check_pantry tool"""
     available_ingredients: List[str]
     missing_ingredients: List[str]
     message: str
 
-class PlaceOrderInput(BaseModel):
+class PlaceOrderInput(LazyModel):
     """Input for place_order tool"""
     items: List[str]
     email: str
 
-class PlaceOrderOutput(BaseModel):
+class PlaceOrderOutput(LazyModel):
     """Output from place_order tool"""
     order_id: str
     total: float
     order_placed: bool
     message: str
 
-class SendEmailInput(BaseModel):
+class SendEmailInput(LazyModel):
     """Input for send_email tool"""
     to_email: str
     subject: str
     body: str
 
-class SendEmailOutput(BaseModel):
+class SendEmailOutput(LazyModel):
     """Output from send_email tool"""
     email_sent: bool
     message: str
 
-class CheckOrderStatusParams(BaseModel):
+class CheckOrderStatusParams(LazyModel):
     """Parameters for checking order status"""
     order_id: Optional[str] = None
 
-class CheckOrderStatusOutput(BaseModel):
+class CheckOrderStatusOutput(LazyModel):
     """Output from check_order_status"""
     order_exists: bool
     order_id: Optional[str]
     message: str
 
-class FetchRecipeParams(BaseModel):
+class FetchRecipeParams(LazyModel):
     """Parameters for fetching recipe"""
     dish_name: str
 
-class DisplayRecipeParams(BaseModel):
+class DisplayRecipeParams(LazyModel):
     """Parameters for displaying recipe"""
     steps: List[str]
 
-class InvalidInputParams(BaseModel):
+class InvalidInputParams(LazyModel):
     """Parameters for invalid input"""
     message: str
 
-class EmailFormatParams(BaseModel):
+class EmailFormatParams(LazyModel):
     """Parameters for formatting email"""
     items: List[str]
     order_id: str
     total: float
 
-class ActionPlan(BaseModel):
+class ActionPlan(LazyModel):
     """Action plan from LLM"""
     type: str
     function: Optional[str] = None
@@ -119,7 +138,7 @@ class ActionPlan(BaseModel):
     value: Optional[str] = None
     on_fail: Optional[str] = None
 
-class Decision(BaseModel):
+class Decision(LazyModel):
     """Decision made by decision layer"""
     action: ActionType
     params: Union[
@@ -135,7 +154,7 @@ class Decision(BaseModel):
     fallback: Optional[str] = None
 
 # LLM Interaction Models
-class ReasoningBlock(BaseModel):
+class ReasoningBlock(LazyModel):
     """Model for LLM reasoning steps"""
     type: Literal["reasoning_block"]
     reasoning_type: str
@@ -144,20 +163,20 @@ class ReasoningBlock(BaseModel):
     next: str
     fallback_plan: str
 
-class FunctionCall(BaseModel):
+class FunctionCall(LazyModel):
     """Model for LLM function calls"""
     type: Literal["function_call"]
     function: str
     parameters: Dict[str, Any]
     on_fail: str
 
-class FinalAnswer(BaseModel):
+class FinalAnswer(LazyModel):
     """Model for LLM final answers"""
     type: Literal["final_answer"]
     value: str
 
 # Perception Models
-class RawUserInput(BaseModel):
+class RawUserInput(LazyModel):
     """Model for validating web form or user input"""
     dish_name: str | None = Field(
         None, 
@@ -165,7 +184,7 @@ class RawUserInput(BaseModel):
         max_length=100,
         description="Name of the dish to cook"
     )
-    user_email: EmailStr | None = Field(
+    user_email: Email | None = Field(
         None,
         description="User's email for order notifications"
     )
@@ -179,27 +198,28 @@ class RawUserInput(BaseModel):
             }
         }
 
-class PerceptionError(BaseModel):
+class PerceptionError(LazyModel):
     """Model for perception layer errors"""
     error_type: str
     message: str
     details: Dict[str, Any] = Field(default_factory=dict)
 
 # Memory Models
-class AgentMemory(BaseModel):
+class AgentMemory(LazyModel):
     """Model for agent's memory state"""
     # Core state
-    dish_name: constr(min_length=1, max_length=100) = ""
-    pantry_items: List[constr(min_length=1, max_length=50)] = Field(default_factory=list)
+    # Internal state is trusted, input constraints are checked once in RawUserInput
+    dish_name: str = ""
+    pantry_items: List[str] = Field(default_factory=list)
     available_pantry_items: List[str] = Field(default_factory=list)  # New field for user's available ingredients
-    required_ingredients: List[constr(min_length=1, max_length=50)] = Field(default_factory=list)
-    missing_ingredients: List[constr(min_length=1, max_length=50)] = Field(default_factory=list)
+    required_ingredients: List[str] = Field(default_factory=list)
+    missing_ingredients: List[str] = Field(default_factory=list)
     recipe_steps: List[str] = Field(default_factory=list)
     order_placed: bool = False
     order_id: Optional[str] = None
     order_details: Dict[str, Any] = Field(default_factory=dict)  # Store order details including items and total
     email_sent: bool = False
-    user_email: Optional[EmailStr] = None
+    user_email: Optional[str] = None
     
     # Metadata
     current_state: str = "initial"  # Track process state
@@ -208,7 +228,7 @@ class AgentMemory(BaseModel):
     retries: int = 0
     last_error: Optional[str] = None
 
-class MemoryError(BaseModel):
+class MemoryError(LazyModel):
     """Model for memory layer errors"""
     error_type: str
     message: str
@@ -217,38 +237,62 @@ class MemoryError(BaseModel):
 # Union type for LLM responses
 LLMResponse = Union[ReasoningBlock, FunctionCall, FinalAnswer]
 
-class CheckIngredientsParams(BaseModel):
+class CheckIngredientsParams(LazyModel):
     """Parameters for check ingredients action"""
     required: List[str]
     available: List[str]
 
-class PlaceOrderParams(BaseModel):
+class PlaceOrderParams(LazyModel):
     """Parameters for place order action"""
     items: List[str]
 
-class SendEmailParams(BaseModel):
+class SendEmailParams(LazyModel):
     """Parameters for send email action"""
     email: str
     order_id: str
     items: List[str]
 
-class DecisionContext(BaseModel):
+class DecisionContext(LazyModel):
     """Model representing the input context for decision making"""
     current_state: Dict[str, Any]
     system_prompt: str
 
 # Action Models
-class ErrorResponse(BaseModel):
+class ErrorResponse(LazyModel):
     """Model for standardized error responses"""
     error_type: str
     message: str
     details: Dict[str, Any] = Field(default_factory=dict)
 
-class GetOrderStatusInput(BaseModel):
+# Tool Discovery Models
+class ToolInfo(LazyModel):
+    """Name, description and parameter types of an MCP tool"""
+    name: str
+    description: str = "No description available"
+    params: List[Tuple[str, str]] = Field(default_factory=list)
+
+    @classmethod
+    def from_tool(cls, tool: Any) -> "ToolInfo":
+        """Build from an mcp.types.Tool, reading its input schema once"""
+        properties = (tool.inputSchema or {}).get("properties", {})
+        return cls(
+            name=tool.name,
+            description=tool.description or "No description available",
+            params=[(name, info.get("type", "unknown")) for name, info in properties.items()]
+        )
+
+    @property
+    def params_str(self) -> str:
+        """Parameters formatted as 'name: type' pairs"""
+        if not self.params:
+            return "no parameters"
+        return ", ".join(f"{name}: {param_type}" for name, param_type in self.params)
+
+class GetOrderStatusInput(LazyModel):
     """Input for get_order_status tool"""
     order_id: str
 
-class GetOrderStatusOutput(BaseModel):
+class GetOrderStatusOutput(LazyModel):
     """Output from get_order_status tool"""
     order_id: str
     status: str
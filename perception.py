@@ -1,17 +1,26 @@
 from typing import Dict, Any, List, Optional
+from collections import OrderedDict
 import logging
-from models import UserIntent, PerceptionError, RawUserInput, LLMResponse
+from models import UserIntent, PerceptionError, RawUserInput, LLMResponse, EMAIL_RE
 from google import genai
-import json
+from llm import generate_with_timeout, generate_json_with_timeout
+import orjson
+import asyncio
+import sys
 
 # Get logger for this module
 logger = logging.getLogger(__name__)
 
+# Number of dish names whose LLM understanding is kept for reuse
+ENHANCE_CACHE_SIZE = 1024
+
 class PerceptionLayer:
     def __init__(self, llm_client: genai.Client):
         logger.debug("Initializing PerceptionLayer")
         self.llm_client = llm_client
         self.last_dish_name = None  # Store last valid dish name
+        # Normalized dish name -> dish name extracted by the LLM, least recently used first
+        self._enhance_cache: "OrderedDict[str, Optional[str]]" = OrderedDict()
 
     async def parse_input(self, user_input: dict) -> UserIntent:
         """Parse and validate user input into structured format using LLM"""
@@ -21,27 +30,23 @@ class PerceptionLayer:
             # First validate the raw input structure
             raw_input = RawUserInput.model_validate(user_input)
             
-            # Update last_dish_name if new one provided
-            if raw_input.dish_name:
-                self.last_dish_name = raw_input.dish_name
-                logger.debug(f"Updated dish name: {self.last_dish_name}")
-
-            # Use LLM to enhance understanding if needed
+            # Update last_dish_name if new one provided, preferring the dish name
+            # the LLM extracted and falling back to what the user typed
             if raw_input.dish_name:
                 enhanced_input = await self._enhance_understanding(raw_input)
-                if raw_input.dish_name:
-                    self.last_dish_name = raw_input.dish_name
+                self.last_dish_name = enhanced_input.dish_name or raw_input.dish_name
+                logger.debug("Updated dish name: %s", self.last_dish_name)
 
-            # Then validate and convert to UserIntent
-            intent = UserIntent(
-                dish_name=self.last_dish_name or raw_input.dish_name or "",  # Use last valid dish name if available
+            # raw_input is already validated, so build UserIntent without a second validation pass
+            intent = UserIntent.model_construct(
+                dish_name=self.last_dish_name or "",  # Use last valid dish name if available
                 user_email=raw_input.user_email or None
             )
             
             return intent
             
         except Exception as e:
-            logger.error(f"Error parsing user input: {e}", exc_info=True)
+            logger.error("Error parsing user input: %s", e, exc_info=True)
             error = PerceptionError(
                 error_type="ValidationError",
                 message=f"Invalid input format: {str(e)}",
@@ -51,7 +56,17 @@ class PerceptionLayer:
 
     async def _enhance_understanding(self, raw_input: RawUserInput) -> UserIntent:
         """Enhance understanding of user input using LLM"""
-        logger.debug(f"Enhancing understanding of raw input: {raw_input}")
+        logger.debug("Enhancing understanding of raw input: %s", raw_input)
+        
+        # The same dish asked for again gets the same answer, skip the LLM call
+        cache_key = raw_input.dish_name.strip().lower()
+        if cache_key in self._enhance_cache:
+            self._enhance_cache.move_to_end(cache_key)
+            logger.debug("Using cached understanding for dish: %s", cache_key)
+            return UserIntent(
+                dish_name=self._enhance_cache[cache_key],
+                user_email=raw_input.user_email
+            )
         
         # Create prompt for LLM
         prompt = f"""Given the following user input, extract the dish name if present.
@@ -67,9 +82,8 @@ Respond in the following JSON format:
 Only include the JSON response, no other text."""
 
         try:
-            # Get LLM response using the correct method
-            response = await self._generate_with_timeout(prompt)
-            enhanced = response.text.strip()
+            # Stream the LLM response, reading stops as soon as the JSON object is complete
+            enhanced = (await generate_json_with_timeout(self.llm_client, prompt)).strip()
             
             # Clean up response text
             if enhanced.startswith("```json"):
@@ -82,17 +96,22 @@ Only include the JSON response, no other text."""
             
             # Parse response
             try:
-                parsed = json.loads(enhanced)
-                logger.debug(f"Parsed LLM response: {parsed}")
+                parsed = orjson.loads(enhanced)
+                logger.debug("Parsed LLM response: %s", parsed)
+                
+                # Only successful parses are cached so failures get retried
+                self._enhance_cache[cache_key] = parsed.get("dish_name")
+                if len(self._enhance_cache) > ENHANCE_CACHE_SIZE:
+                    self._enhance_cache.popitem(last=False)
                 
                 # Create UserIntent with parsed values
                 return UserIntent(
                     dish_name=parsed.get("dish_name"),
                     user_email=raw_input.user_email
                 )
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse LLM response: {e}")
-                logger.error(f"Raw response: {enhanced}")
+            except orjson.JSONDecodeError as e:
+                logger.error("Failed to parse LLM response: %s", e)
+                logger.error("Raw response: %s", enhanced)
                 # Return original input on parse failure
                 return UserIntent(
                     dish_name=raw_input.dish_name,
@@ -100,7 +119,7 @@ Only include the JSON response, no other text."""
                 )
                 
         except Exception as e:
-            logger.error(f"Error in LLM enhancement: {e}")
+            logger.error("Error in LLM enhancement: %s", e)
             # Return original input on any error
             return UserIntent(
                 dish_name=raw_input.dish_name,
@@ -109,37 +128,21 @@ Only include the JSON response, no other text."""
 
     async def _generate_with_timeout(self, prompt: str, timeout: int = 30) -> Any:
         """Generate LLM response with timeout"""
-        import asyncio
-        
         try:
-            # Add delay to prevent throttling
-            await asyncio.sleep(2)
-            
-            # Run LLM generation in thread pool
-            loop = asyncio.get_event_loop()
-            response = await asyncio.wait_for(
-                loop.run_in_executor(
-                    None,
-                    lambda: self.llm_client.models.generate_content(
-                        model="gemini-2.0-flash",
-                        contents=prompt
-                    )
-                ),
-                timeout=timeout
-            )
-            return response
+            # Throttled and awaited on the event loop, retried once on a slow first attempt
+            return await generate_with_timeout(self.llm_client, prompt, timeout)
         except asyncio.TimeoutError:
             logger.error("LLM generation timed out")
             raise
         except Exception as e:
-            logger.error(f"Error in LLM generation: {e}")
+            logger.error("Error in LLM generation: %s", e)
             raise
 
     async def get_dish_name(self) -> str:
         """Get the dish name from user input"""
         print("\nWhat dish would you like to make? (e.g. 'pasta carbonara' or 'chicken curry')")
-        import sys
-        dish_name = sys.stdin.readline().strip().lower()
+        # Read in a thread so waiting on the user doesn't block the event loop
+        dish_name = (await asyncio.to_thread(sys.stdin.readline)).strip().lower()
         return dish_name
 
     async def get_pantry_items(self) -> List[str]:
@@ -150,16 +153,16 @@ Only include the JSON response, no other text."""
                 "Please list the items in your pantry, one per line. Enter 'done' when finished."
             )
             
-            if not response or not response.content:
+            if not response or not response.text:
                 logger.warning("No pantry items received from LLM")
                 return []
                 
-            # Parse items from response
-            items = []
-            for line in response.content[0].text.split('\n'):
-                item = line.strip().lower()
-                if item and item != 'done':
-                    items.append(item)
+            # Parse items from response in a single pass over its lines,
+            # lowercasing the whole text once rather than every line
+            items = [
+                item for item in map(str.strip, response.text.lower().splitlines())
+                if item and item != 'done'
+            ]
                     
             # Validate items
             if not items:
@@ -169,15 +172,14 @@ Only include the JSON response, no other text."""
             return items
             
         except Exception as e:
-            logger.error(f"Error getting pantry items: {e}", exc_info=True)
+            logger.error("Error getting pantry items: %s", e, exc_info=True)
             return []
 
     async def get_email(self) -> str:
         """Get user's email address with basic validation"""
         while True:
             print("\nPlease enter your email address for order notifications:")
-            import sys
-            email = sys.stdin.readline().strip()
-            if "@" in email and "." in email:  # Basic email validation
+            email = (await asyncio.to_thread(sys.stdin.readline)).strip()
+            if EMAIL_RE.match(email):  # Same shape check RawUserInput applies
                 return email
             print("Invalid email format. Please try again.") 
\ No newline at end of file
@@ -1,18 +1,15 @@
 from mcp.server import FastMCP
-from mcp.types import TextContent
-from typing import Dict, List, Any
+from typing import Dict, Any
 from models import (
-    GetRecipeInput, GetRecipeOutput,
+    GetRecipeOutput,
     ErrorResponse,
-    PlaceOrderInput, PlaceOrderOutput,
-    SendEmailInput, SendEmailOutput,
     PantryCheckInput, PantryCheckOutput
 )
-from pydantic import BaseModel
+from log_config import set_root_level
+import orjson
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Get logger for this module, handlers and level are configured in main()
 logger = logging.getLogger(__name__)
 
 
@@ -343,64 +340,85 @@ RECIPES = {
     }
 }
 
+def text_response(text: str) -> dict:
+    """Wrap serialized text in the MCP content envelope returned by every tool"""
+    return {"content": [{"type": "text", "text": text}]}
+
+# Recipes never change while the server runs, so each one is validated and
+# serialized once here instead of on every request
+RECIPE_JSON = {
+    name: GetRecipeOutput(
+        required_ingredients=recipe["ingredients"],
+        recipe_steps=recipe["steps"]
+    ).model_dump_json()
+    for name, recipe in RECIPES.items()
+}
+
+# Complete MCP responses for each recipe, returned as-is (they are only read
+# when the server serializes them)
+RECIPE_RESPONSES = {name: text_response(recipe_json) for name, recipe_json in RECIPE_JSON.items()}
+
+# Number of near-match recipe names suggested when a dish isn't found
+MAX_SUGGESTIONS = 3
+
+def trigrams(text: str) -> frozenset:
+    """Character trigrams of text, padded so short words still get some"""
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+# Trigrams of every recipe name, built once so a miss only has to trigram the request
+RECIPE_TRIGRAMS = {name: trigrams(name) for name in RECIPES}
+
+def suggest_recipes(dish_name: str) -> list:
+    """Recipe names closest to dish_name by trigram overlap, best first"""
+    requested = trigrams(dish_name)
+    scored = []
+    for name, name_trigrams in RECIPE_TRIGRAMS.items():
+        shared = len(requested & name_trigrams)
+        if shared:
+            scored.append((shared / len(requested | name_trigrams), name))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [name for _, name in scored[:MAX_SUGGESTIONS]]
+
+# "Recipe not found" error serialized once, the requested name and suggestions are filled in per call
+NOT_FOUND_PLACEHOLDER = "{dish_name}"
+SUGGESTIONS_PLACEHOLDER = "{suggestions}"
+HINT_PLACEHOLDER = "{hint}"
+NOT_FOUND_TEMPLATE = ErrorResponse(
+    error_type="RecipeNotFound",
+    message=f"Recipe for '{NOT_FOUND_PLACEHOLDER}' not found{HINT_PLACEHOLDER}",
+    details={
+        "requested_recipe": NOT_FOUND_PLACEHOLDER,
+        "suggestions": SUGGESTIONS_PLACEHOLDER,
+        "available_recipes": list(RECIPES.keys())
+    }
+).model_dump_json()
+
+def not_found_json(dish_name: str) -> str:
+    """Fill the requested dish name and near matches into the pre-serialized not-found error"""
+    # Suggestions go in first, they are recipe names and can't contain the name placeholder
+    suggested = suggest_recipes(dish_name)
+    # The message is what the agent shows, so the near matches are named there too
+    hint = f". Did you mean: {', '.join(suggested)}?" if suggested else ""
+    text = NOT_FOUND_TEMPLATE.replace(HINT_PLACEHOLDER, hint)
+    text = text.replace(f'"{SUGGESTIONS_PLACEHOLDER}"', orjson.dumps(suggested).decode())
+    # Escape the name the way it has to appear inside a JSON string
+    escaped = orjson.dumps(dish_name).decode()[1:-1]
+    return text.replace(NOT_FOUND_PLACEHOLDER, escaped)
+
 @mcp.tool()
-def get_recipe(input: GetRecipeInput) -> dict:
+def get_recipe(dish_name: str) -> dict:
     """Get recipe and ingredients for a dish"""
-    try:
-        dish_name = input.dish_name.lower()
-        
-        if dish_name not in RECIPES:
-            error = ErrorResponse(
-                error_type="RecipeNotFound",
-                message=f"Recipe for '{dish_name}' not found",
-                details={
-                    "requested_recipe": dish_name,
-                    "available_recipes": list(RECIPES.keys())
-                }
-            )
-            return {
-                "content": [
-                    {
-                        "type": "text",
-                        "text": error.model_dump_json()
-                    }
-                ]
-            }
-        
-        recipe = RECIPES[dish_name]
-        
-        # Create and validate output model
-        output = GetRecipeOutput(
-            required_ingredients=recipe["ingredients"],
-            recipe_steps=recipe["steps"]
-        )
-        
-        # Return in MCP format with model data
-        return {
-            "content": [
-                {
-                    "type": "text",
-                    "text": output.model_dump_json()
-                }
-            ]
-        }
-    except Exception as e:
-        error = ErrorResponse(
-            error_type="RecipeError",
-            message=f"Failed to get recipe: {str(e)}",
-            details={
-                "dish_name": input.dish_name if hasattr(input, 'dish_name') else None,
-                "error": str(e)
-            }
-        )
-        return {
-            "content": [
-                {
-                    "type": "text",
-                    "text": error.model_dump_json()
-                }
-            ]
-        }
+    # Takes the dish name directly, so FastMCP doesn't build a nested
+    # GetRecipeInput model for every call
+    dish_name = dish_name.lower()
+    response = RECIPE_RESPONSES.get(dish_name)
+    
+    if response is None:
+        return text_response(not_found_json(dish_name))
+    
+    # Already in MCP format with the pre-serialized model data
+    return response
 
 # @mcp.tool()
 # def compare_ingredients(input: CompareIngredientsInput) -> dict:
@@ -446,6 +464,13 @@ def get_recipe(input: GetRecipeInput) -> dict:
 #             ]
 #         }
 
+# check_pantry always answers the same way, so its whole response is built once
+PANTRY_CHECK_RESPONSE = text_response(PantryCheckOutput(
+    available_ingredients=[],
+    missing_ingredients=[],
+    message="Pantry check is now handled by the client application directly."
+).model_dump_json())
+
 @mcp.tool()
 def check_pantry(input_data: PantryCheckInput) -> Dict[str, Any]:
     """Check what ingredients are available in user's pantry and what's missing from required ingredients so that you may place an order for the missing items."""
@@ -453,19 +478,13 @@ def check_pantry(input_data: PantryCheckInput) -> Dict[str, Any]:
     
     # This function is now implemented directly in the action layer 
     # to avoid blocking on user input
-    result = PantryCheckOutput(
-        available_ingredients=[],
-        missing_ingredients=[],
-        message="Pantry check is now handled by the client application directly."
-    )
-    
-    return {
-        "content": [{
-            "text": result.model_dump_json()
-        }]
-    }
+    return PANTRY_CHECK_RESPONSE
 
 def main():
+    # Configure logging only when run as the server, importing the module leaves it alone.
+    # The level follows LOG_LEVEL the same way the agent's does
+    logging.basicConfig()
+    set_root_level()
     print("Recipe MCP server running...")
     mcp.run()
 
@@ -0,0 +1,16 @@
+import orjson
+from memory import MemoryLayer, delta_log_path
+
+def test_load_memory_keeps_deltas_before_torn_log_line(tmp_path):
+    """A truncated last log line keeps the snapshot and every earlier delta"""
+    memory_file = tmp_path / "memory.json"
+    memory_file.write_bytes(orjson.dumps({"retries": 21}))
+    with open(delta_log_path(str(memory_file)), 'wb') as f:
+        f.write(orjson.dumps({"dish_name": "pasta carbonara"}) + b"\n")
+        f.write(b'{"current_st')
+
+    memory = MemoryLayer(str(memory_file))
+
+    assert memory.get_memory()["retries"] == 21
+    assert memory.get_memory()["dish_name"] == "pasta carbonara"
+    assert memory.get_memory()["current_state"] == "initial"